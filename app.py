@@ -1,37 +1,68 @@
+import io
 import json
+import os
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
 import streamlit as st
 import yaml
 
 from engine import (
     parse_sessions, make_time_index, baseline_load_curve,
-    greedy_optimize_schedule, Tariff, estimate_costs
+    prepare_sessions_for_greedy, greedy_optimize_schedule, Tariff, estimate_costs, build_rate_vector,
+    costs_and_savings, SAVINGS_FIELDS
 )
 
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:  # PyYAML built without libyaml
+    from yaml import SafeLoader
+
 st.set_page_config(page_title="EV Energy OS — Depot Simulation Demo", layout="wide")
 
 @st.cache_data
-def load_default_sessions() -> pd.DataFrame:
-    return pd.read_csv("data/sessions.csv")
+def load_default_sessions() -> bytes:
+    with open("data/sessions.csv", "rb") as f:
+        return f.read()
+
+@st.cache_data
+def load_sessions(raw_bytes: bytes) -> pd.DataFrame:
+    return parse_sessions(pd.read_csv(io.BytesIO(raw_bytes)))
+
+@st.cache_data
+def cached_time_index(start: pd.Timestamp, end: pd.Timestamp, bin_minutes: int) -> pd.DatetimeIndex:
+    return make_time_index(start, end, bin_minutes)
 
 @st.cache_data
-def load_config() -> dict:
-    return yaml.safe_load(open("config.yaml", "r"))
+def cached_rate_vector(start: pd.Timestamp, end: pd.Timestamp, bin_minutes: int, flat_rate: float, tou_blocks: list):
+    tariff = Tariff(flat_energy_rate_per_kwh=flat_rate, demand_charge_per_kw=0.0, tou_blocks=tou_blocks)
+    return build_rate_vector(make_time_index(start, end, bin_minutes), tariff)
+
+@st.cache_data
+def load_config(mtime: float) -> dict:
+    # mtime is only part of the cache key, so editing config.yaml invalidates the cached copy
+    with open("config.yaml", "r") as f:
+        return yaml.load(f, Loader=SafeLoader)
 
 def to_csv_bytes(df: pd.DataFrame) -> bytes:
-    return df.to_csv(index=False).encode("utf-8")
+    # second resolution so timestamps print like run_demo.py's pandas CSVs (no ".000000")
+    df = df.astype({c: "datetime64[s]" for c in df.select_dtypes(include="datetime").columns})
+    buf = pa.BufferOutputStream()
+    pacsv.write_csv(pa.Table.from_pandas(df, preserve_index=False), buf)
+    return buf.getvalue().to_pybytes()
 
 st.title("EV Energy OS — Depot Simulation + Optimization (V0.1)")
 st.caption("Upload depot charging sessions, simulate baseline vs optimized depot load, and view a savings range (conservative → expected → aggressive).")
 
-cfg = load_config()
+cfg = load_config(os.path.getmtime("config.yaml"))
 
 with st.sidebar:
     st.header("Inputs")
 
     uploaded = st.file_uploader("Upload sessions.csv", type=["csv"])
     if uploaded is not None:
-        raw = pd.read_csv(uploaded)
+        raw = uploaded.getvalue()
         st.success("Uploaded sessions.csv")
     else:
         raw = load_default_sessions()
@@ -52,7 +83,7 @@ with st.sidebar:
 
     run = st.button("Run simulation", type="primary")
 
-sessions = parse_sessions(raw)
+sessions = load_sessions(raw)
 
 if sessions.empty:
     st.error("No valid sessions found. Check earliest_start and latest_end columns.")
@@ -60,13 +91,14 @@ if sessions.empty:
 
 t0 = sessions["earliest_start"].min().floor("D")
 t1 = t0 + pd.Timedelta(hours=24)
-idx = make_time_index(t0, t1, int(time_bin))
+idx = cached_time_index(t0, t1, int(time_bin))
 
 tariff = Tariff(
     flat_energy_rate_per_kwh=float(flat_rate),
     demand_charge_per_kw=float(demand_rate),
     tou_blocks=cfg["tariff"].get("tou_blocks", []),
 )
+rates = cached_rate_vector(t0, t1, int(time_bin), tariff.flat_energy_rate_per_kwh, tariff.tou_blocks)
 
 colA, colB = st.columns([1.1, 1])
 
@@ -82,27 +114,27 @@ with colB:
 
 if run:
     baseline = baseline_load_curve(sessions, idx, int(time_bin))
-    base_costs = estimate_costs(baseline, tariff, int(time_bin))
+    base_costs = estimate_costs(baseline, tariff, int(time_bin), rates=rates)
+    ss_sorted = prepare_sessions_for_greedy(sessions, int(time_bin))
 
     def scenario(cap_kw: float):
         schedule, load = greedy_optimize_schedule(
-            sessions=sessions,
+            sessions=ss_sorted,
             time_index=idx,
             bin_minutes=int(time_bin),
             depot_power_cap_kw=float(cap_kw),
             max_concurrent_chargers=int(max_concurrent),
         )
-        costs = estimate_costs(load, tariff, int(time_bin))
-        savings = {
-            "peak_kw_reduction_pct": (1 - costs["peak_kw"]/base_costs["peak_kw"]) * 100 if base_costs["peak_kw"] else 0,
-            "total_cost_savings": base_costs["total_cost"] - costs["total_cost"],
-            "total_cost_savings_pct": (1 - costs["total_cost"]/base_costs["total_cost"]) * 100 if base_costs["total_cost"] else 0,
-        }
+        costs = costs_and_savings(
+            load.to_numpy(), rates, int(time_bin)/60.0, tariff.demand_charge_per_kw,
+            base_costs["total_cost"], base_costs["peak_kw"],
+        )
+        savings = {k: costs.pop(k) for k in SAVINGS_FIELDS}
         return schedule, load, costs, savings
 
-    cons = scenario(cons_cap)
-    exp = scenario(exp_cap)
-    agg = scenario(agg_cap)
+    # scenarios only read ss_sorted, idx, tariff and rates, so they can run side by side
+    with ThreadPoolExecutor(max_workers=3) as ex:
+        cons, exp, agg = list(ex.map(scenario, [cons_cap, exp_cap, agg_cap]))
 
     st.divider()
     st.subheader("Load curves")
@@ -116,23 +148,20 @@ if run:
 
     st.divider()
     st.subheader("Savings range")
-    rows = []
-    for name, cap, pack in [
-        ("Conservative", cons_cap, cons),
-        ("Expected", exp_cap, exp),
-        ("Aggressive", agg_cap, agg),
-    ]:
-        costs = pack[2]; savings = pack[3]
-        rows.append({
-            "Scenario": name,
-            "Depot cap (kW)": float(cap),
-            "Peak kW": round(float(costs["peak_kw"]), 2),
-            "Peak reduction %": round(float(savings["peak_kw_reduction_pct"]), 2),
-            "Total cost": round(float(costs["total_cost"]), 2),
-            "Savings": round(float(savings["total_cost_savings"]), 2),
-            "Savings %": round(float(savings["total_cost_savings_pct"]), 2),
-        })
-    st.dataframe(pd.DataFrame(rows), use_container_width=True)
+    names = ["Conservative", "Expected", "Aggressive"]
+    caps = [float(cons_cap), float(exp_cap), float(agg_cap)]
+    packs = [cons, exp, agg]
+    costs = [pack[2] for pack in packs]
+    savings = [pack[3] for pack in packs]
+    st.dataframe(pd.DataFrame({
+        "Scenario": names,
+        "Depot cap (kW)": caps,
+        "Peak kW": [round(float(c["peak_kw"]), 2) for c in costs],
+        "Peak reduction %": [round(float(sv["peak_kw_reduction_pct"]), 2) for sv in savings],
+        "Total cost": [round(float(c["total_cost"]), 2) for c in costs],
+        "Savings": [round(float(sv["total_cost_savings"]), 2) for sv in savings],
+        "Savings %": [round(float(sv["total_cost_savings_pct"]), 2) for sv in savings],
+    }), use_container_width=True)
 
     st.subheader("Downloads")
     d1, d2, d3 = st.columns(3)
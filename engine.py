@@ -1,8 +1,18 @@
 from __future__ import annotations
+import heapq
+import numpy as np
 import pandas as pd
 from dataclasses import dataclass
-from datetime import timedelta
-from typing import Dict, List, Tuple
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+try:
+    from numba import njit
+except ImportError:  # numba is optional; the placement kernel then runs as plain Python
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda fn: fn
 
 @dataclass
 class Tariff:
@@ -10,11 +20,21 @@ class Tariff:
     demand_charge_per_kw: float
     tou_blocks: List[dict]
 
+SESSION_TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+def _to_datetime(values: pd.Series) -> pd.Series:
+    # strict format is what generate_synthetic_data writes; anything else goes through the slow mixed parser
+    try:
+        return pd.to_datetime(values, format=SESSION_TIME_FORMAT)
+    except (ValueError, TypeError):
+        return pd.to_datetime(values, format="mixed")
+
+def to_ns(values: pd.Series) -> np.ndarray:
+    return values.values.astype("datetime64[ns]").view("i8")
+
 def parse_sessions(df: pd.DataFrame) -> pd.DataFrame:
-    out = df.copy()
-    out["earliest_start"] = pd.to_datetime(out["earliest_start"], format="mixed")
-    out["latest_end"] = pd.to_datetime(out["latest_end"], format="mixed")
-    return out[out["latest_end"] > out["earliest_start"]].copy()
+    out = df.assign(earliest_start=_to_datetime(df["earliest_start"]), latest_end=_to_datetime(df["latest_end"]))
+    return out[out["latest_end"] > out["earliest_start"]]
 
 def make_time_index(start: pd.Timestamp, end: pd.Timestamp, bin_minutes: int) -> pd.DatetimeIndex:
     return pd.date_range(start=start, end=end, freq=f"{bin_minutes}min", inclusive="left")
@@ -28,19 +48,66 @@ def tou_rate_for_ts(ts: pd.Timestamp, tariff: Tariff) -> float:
             return float(b["rate_per_kwh"])
     return float(tariff.flat_energy_rate_per_kwh)
 
+def _session_bins(sessions: pd.DataFrame, time_index: pd.DatetimeIndex, bin_minutes: int) -> Tuple[np.ndarray, np.ndarray]:
+    # [start_bin, end_bin) covers every bin that starts inside a session's window, clipped to the horizon
+    t0_ns = time_index[0].value
+    step_ns = bin_minutes*60*10**9
+    starts = to_ns(sessions["earliest_start"])
+    ends = to_ns(sessions["latest_end"])
+    start_bin = np.clip(-((t0_ns - starts)//step_ns), 0, len(time_index))
+    end_bin = np.clip((ends - t0_ns + step_ns - 1)//step_ns, 0, len(time_index))
+    return start_bin, np.maximum(end_bin, start_bin)
+
 def baseline_load_curve(sessions: pd.DataFrame, time_index: pd.DatetimeIndex, bin_minutes: int) -> pd.Series:
-    load = pd.Series(0.0, index=time_index)
     bin_hours = bin_minutes/60.0
-    for _, s in sessions.iterrows():
-        needed_kwh = float(s["energy_kwh"]); kw = float(s["max_kw"])
-        t = s["earliest_start"]; end = s["latest_end"]
-        while needed_kwh > 1e-6 and t < end:
-            if t in load.index:
-                deliver = min(needed_kwh, kw*bin_hours)
-                load.loc[t] += deliver/bin_hours
-                needed_kwh -= deliver
-            t = t + timedelta(minutes=bin_minutes)
-    return load
+    start_bin, end_bin = _session_bins(sessions, time_index, bin_minutes)
+    energy_kwh = sessions["energy_kwh"].to_numpy(dtype=float)
+    kw = sessions["max_kw"].to_numpy(dtype=float)
+    # blank energy or a non-positive/non-finite max_kw charges nothing, as the old per-bin loop did
+    valid = ~np.isnan(energy_kwh) & np.isfinite(kw) & (kw > 0)
+    full_bins = np.divide(energy_kwh, kw*bin_hours, out=np.zeros_like(energy_kwh), where=valid)
+    # whole bins at max_kw, then one partial bin for whatever is left if the window still has room
+    n_full = np.clip(np.floor(full_bins), 0, end_bin - start_bin).astype(np.int64)
+    rem_kwh = np.where(valid, energy_kwh - n_full*kw*bin_hours, 0.0)
+    has_rem = (rem_kwh > 1e-6) & (start_bin + n_full < end_bin)
+    offsets = np.arange(n_full.sum()) - np.repeat(n_full.cumsum() - n_full, n_full)
+    bins = np.concatenate([np.repeat(start_bin, n_full) + offsets, (start_bin + n_full)[has_rem]])
+    weights = np.concatenate([np.repeat(kw, n_full), rem_kwh[has_rem]/bin_hours])
+    load = np.bincount(bins, weights=weights, minlength=len(time_index))
+    return pd.Series(load, index=time_index)
+
+@njit(cache=True, nogil=True)
+def _place_session(load_arr, chargers_arr, start_b, end_b, needed_kwh, kw, bin_hours, cap, max_concurrent,
+                   session, out_session, out_bin, out_kw, out_kwh, cursor):
+    # give the session its least-loaded feasible bin (earliest on ties) until it is charged. Only
+    # the session's own placements change state, and a placed bin is never reused, so heap entries
+    # never go stale and a bin that fails the constraints once can be dropped for good.
+    heap = [(load_arr[b], b) for b in range(start_b, end_b)]
+    heapq.heapify(heap)
+    while needed_kwh > 1e-6 and heap:
+        pick = heapq.heappop(heap)[1]
+        if chargers_arr[pick] >= max_concurrent or load_arr[pick] + kw > cap:
+            continue
+        deliver = min(needed_kwh, kw*bin_hours)
+        used_kw = deliver/bin_hours
+        load_arr[pick] += used_kw
+        chargers_arr[pick] += 1
+        out_session[cursor] = session
+        out_bin[cursor] = pick
+        out_kw[cursor] = round(used_kw, 3)
+        out_kwh[cursor] = round(deliver, 3)
+        cursor += 1
+        needed_kwh -= deliver
+    return cursor
+
+def prepare_sessions_for_greedy(sessions: pd.DataFrame, bin_minutes: int) -> pd.DataFrame:
+    # tightest sessions (energy needed vs. energy deliverable in window) are placed first
+    bin_hours = bin_minutes/60.0
+    window_bins = ((sessions["latest_end"]-sessions["earliest_start"]).dt.total_seconds()/60/bin_minutes).clip(lower=1)
+    tightness = (sessions["energy_kwh"]/(sessions["max_kw"]*window_bins*bin_hours)).to_numpy(dtype=float)
+    # np.lexsort sorts by the last key first and is stable, like sort_values on two columns
+    order = np.lexsort((to_ns(sessions["earliest_start"]), -tightness))
+    return sessions.iloc[order]
 
 def greedy_optimize_schedule(
     sessions: pd.DataFrame,
@@ -49,64 +116,98 @@ def greedy_optimize_schedule(
     depot_power_cap_kw: float,
     max_concurrent_chargers: int
 ) -> Tuple[pd.DataFrame, pd.Series]:
+    # sessions are placed in the given order; pass them through prepare_sessions_for_greedy first
     bin_hours = bin_minutes/60.0
-    load = pd.Series(0.0, index=time_index)
-    chargers = pd.Series(0, index=time_index)
-    rows=[]
-    ss = sessions.copy()
-    ss["window_bins"] = ((ss["latest_end"]-ss["earliest_start"]).dt.total_seconds()/60/bin_minutes).clip(lower=1)
-    ss["tightness"] = ss["energy_kwh"]/(ss["max_kw"]*ss["window_bins"]*bin_hours)
-    ss = ss.sort_values(["tightness","earliest_start"], ascending=[False,True])
-
-    for _, s in ss.iterrows():
-        bins = [t for t in time_index if (t>=s["earliest_start"] and t<s["latest_end"])]
-        if not bins: 
+    if max_concurrent_chargers >= np.iinfo(np.int16).max:
+        raise ValueError(f"max_concurrent_chargers must be below {np.iinfo(np.int16).max}")
+    load_arr = np.zeros(len(time_index))
+    chargers_arr = np.zeros(len(time_index), dtype=np.int16)
+    start_bins, end_bins = _session_bins(sessions, time_index, bin_minutes)
+    energy_kwh = sessions["energy_kwh"].to_numpy(dtype=float)
+    max_kw = sessions["max_kw"].to_numpy(dtype=float)
+    # one row per delivered bin. A session never uses a bin twice, so its window is a hard bound
+    # (the numba kernel does not bounds-check); ceil(kWh / (kW * bin_hours)) + 1 tightens it
+    window = end_bins - start_bins
+    valid = ~np.isnan(energy_kwh) & np.isfinite(max_kw) & (max_kw > 0)
+    needed = np.ceil(np.divide(energy_kwh, max_kw*bin_hours, out=np.zeros_like(energy_kwh), where=valid)) + 1
+    upper = int(np.where(valid, np.clip(needed, 0, window), window).sum())
+    row_session = np.empty(upper, dtype=np.int64)
+    row_bin = np.empty(upper, dtype=np.int64)
+    row_kw = np.empty(upper)
+    row_kwh = np.empty(upper)
+    cur = 0
+
+    for i in range(len(sessions)):
+        if end_bins[i] <= start_bins[i]:
             continue
-        needed_kwh = float(s["energy_kwh"]); kw = float(s["max_kw"])
-        while needed_kwh > 1e-6:
-            feasible=[]
-            for t in bins:
-                if chargers.loc[t] >= max_concurrent_chargers: 
-                    continue
-                if load.loc[t] + kw > depot_power_cap_kw:
-                    continue
-                feasible.append((load.loc[t] + kw, load.loc[t], t))
-            if not feasible:
-                break
-            feasible.sort(key=lambda x: (x[0], x[1]))
-            t = feasible[0][2]
-            deliver = min(needed_kwh, kw*bin_hours)
-            used_kw = deliver/bin_hours
-            load.loc[t] += used_kw
-            chargers.loc[t] += 1
-            rows.append({
-                "session_id": s["session_id"],
-                "vehicle_id": s["vehicle_id"],
-                "bin_start": t,
-                "kw": round(float(used_kw),3),
-                "kwh": round(float(deliver),3),
-            })
-            needed_kwh -= deliver
-            bins.remove(t)
-
-    schedule = pd.DataFrame(rows)
-    if not schedule.empty:
-        schedule["bin_start"] = pd.to_datetime(schedule["bin_start"])
-    return schedule, load
-
-def estimate_costs(load_kw: pd.Series, tariff: Tariff, bin_minutes: int) -> Dict[str,float]:
-    bin_hours = bin_minutes/60.0
-    total_kwh=0.0; energy_cost=0.0
-    for ts, kw in load_kw.items():
-        kwh = float(kw)*bin_hours
-        total_kwh += kwh
-        energy_cost += kwh * tou_rate_for_ts(ts, tariff)
-    peak_kw = float(load_kw.max()) if len(load_kw) else 0.0
-    demand_cost = peak_kw * float(tariff.demand_charge_per_kw)
+        cur = _place_session(
+            load_arr, chargers_arr, start_bins[i], end_bins[i], energy_kwh[i], max_kw[i], bin_hours,
+            float(depot_power_cap_kw), int(max_concurrent_chargers),
+            i, row_session, row_bin, row_kw, row_kwh, cur,
+        )
+
+    row_session = row_session[:cur]
+    schedule = pd.DataFrame({
+        "session_id": sessions["session_id"].to_numpy()[row_session],
+        "vehicle_id": sessions["vehicle_id"].to_numpy()[row_session],
+        "bin_start": time_index[row_bin[:cur]],
+        "kw": row_kw[:cur],
+        "kwh": row_kwh[:cur],
+    })
+    return schedule, pd.Series(load_arr, index=time_index)
+
+def _rates_for_hours(time_index: pd.DatetimeIndex, flat_rate: float, blocks: Tuple[Tuple[float,float,float],...]) -> np.ndarray:
+    h = np.asarray(time_index.hour + time_index.minute/60.0)
+    rates = np.full(len(time_index), float(flat_rate))
+    # apply in reverse so the first matching block wins, as in tou_rate_for_ts
+    for start_hour, end_hour, rate in reversed(blocks):
+        rates[(h >= start_hour) & (h < end_hour)] = rate
+    return rates
+
+@lru_cache(maxsize=32)
+def _cached_rate_vector(start: pd.Timestamp, periods: int, freq, flat_rate: float, blocks: Tuple[Tuple[float,float,float],...]) -> np.ndarray:
+    rates = _rates_for_hours(pd.date_range(start=start, periods=periods, freq=freq), flat_rate, blocks)
+    rates.flags.writeable = False
+    return rates
+
+def build_rate_vector(time_index: pd.DatetimeIndex, tariff: Tariff) -> np.ndarray:
+    blocks = tuple((float(b["start_hour"]), float(b["end_hour"]), float(b["rate_per_kwh"])) for b in tariff.tou_blocks or ())
+    flat_rate = float(tariff.flat_energy_rate_per_kwh)
+    if time_index.freq is None or not len(time_index):
+        return _rates_for_hours(time_index, flat_rate, blocks)
+    return _cached_rate_vector(time_index[0], len(time_index), time_index.freq, flat_rate, blocks)
+
+SAVINGS_FIELDS = ("peak_kw_reduction_pct", "total_cost_savings", "total_cost_savings_pct")
+
+def _costs(load_arr: np.ndarray, rates: np.ndarray, bin_hours: float, demand_rate: float) -> Dict[str,float]:
+    kwh_arr = load_arr*bin_hours
+    energy_cost = float(np.dot(kwh_arr, rates))
+    peak_kw = float(load_arr.max()) if len(load_arr) else 0.0
+    demand_cost = peak_kw * float(demand_rate)
     return {
-        "total_kwh": total_kwh,
+        "total_kwh": float(kwh_arr.sum()),
         "peak_kw": peak_kw,
         "energy_cost": energy_cost,
         "demand_charge_cost": demand_cost,
         "total_cost": energy_cost + demand_cost,
     }
+
+def estimate_costs(load_kw: pd.Series, tariff: Tariff, bin_minutes: int, rates: Optional[np.ndarray] = None) -> Dict[str,float]:
+    if rates is None:
+        rates = build_rate_vector(pd.DatetimeIndex(load_kw.index), tariff)
+    return _costs(load_kw.to_numpy(dtype=float), rates, bin_minutes/60.0, tariff.demand_charge_per_kw)
+
+def costs_and_savings(
+    load_arr: np.ndarray,
+    rates: np.ndarray,
+    bin_hours: float,
+    demand_rate: float,
+    base_total: float,
+    base_peak: float
+) -> Dict[str,float]:
+    # estimate_costs fields plus SAVINGS_FIELDS relative to the baseline totals, in one flat dict
+    out = _costs(np.asarray(load_arr, dtype=float), rates, bin_hours, demand_rate)
+    out["peak_kw_reduction_pct"] = (1 - out["peak_kw"]/base_peak) * 100 if base_peak else 0.0
+    out["total_cost_savings"] = base_total - out["total_cost"]
+    out["total_cost_savings_pct"] = (1 - out["total_cost"]/base_total) * 100 if base_total else 0.0
+    return out
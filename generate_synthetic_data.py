@@ -1,29 +1,28 @@
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-import random
 
 def generate_synthetic_sessions(start_dt: datetime, hours: int=24, n_sessions: int=140, seed: int=7) -> pd.DataFrame:
-    random.seed(seed); np.random.seed(seed)
-    rows=[]
-    horizon_end = start_dt + timedelta(hours=hours)
-    for i in range(n_sessions):
-        arrival_hour = int(np.clip(np.random.normal(loc=19.0, scale=2.5), 0, 23))
-        arrival_min = int(np.random.choice([0,5,10,15,20,25,30,35,40,45,50,55]))
-        arrival = start_dt.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(hours=arrival_hour, minutes=arrival_min)
-        window_hours = float(np.clip(np.random.normal(loc=6.0, scale=2.0), 2.0, 10.0))
-        latest_end = min(arrival + timedelta(hours=window_hours), horizon_end)
-        energy_kwh = float(np.clip(np.random.gamma(shape=3.0, scale=10.0), 10.0, 70.0))
-        max_kw = float(np.random.choice([7.4, 11.0, 22.0, 30.0], p=[0.35,0.30,0.25,0.10]))
-        rows.append({
-            "session_id": f"S{i+1:04d}",
-            "vehicle_id": f"V{random.randint(1,260):04d}",
-            "earliest_start": arrival.strftime("%Y-%m-%d %H:%M:%S"),
-            "latest_end": latest_end.strftime("%Y-%m-%d %H:%M:%S"),
-            "energy_kwh": round(energy_kwh,2),
-            "max_kw": round(max_kw,1),
-        })
-    return pd.DataFrame(rows).sort_values("earliest_start").reset_index(drop=True)
+    rng = np.random.default_rng(seed)
+    n = n_sessions
+    horizon_end = pd.Timestamp(start_dt + timedelta(hours=hours))
+    arrival_hour = np.clip(rng.normal(loc=19.0, scale=2.5, size=n), 0, 23).astype(int)
+    arrival_min = rng.choice(np.arange(0, 60, 5), size=n)
+    window_hours = np.clip(rng.normal(loc=6.0, scale=2.0, size=n), 2.0, 10.0)
+    energy_kwh = np.clip(rng.gamma(shape=3.0, scale=10.0, size=n), 10.0, 70.0)
+    max_kw = rng.choice([7.4, 11.0, 22.0, 30.0], size=n, p=[0.35,0.30,0.25,0.10])
+    vehicle = rng.integers(1, 261, size=n)
+
+    arrival = pd.Series(pd.Timestamp(start_dt).normalize() + pd.to_timedelta(arrival_hour*60 + arrival_min, unit="min"))
+    latest_end = (arrival + pd.to_timedelta(window_hours, unit="h")).clip(upper=horizon_end)
+    return pd.DataFrame({
+        "session_id": "S" + pd.Series(np.arange(1, n+1)).astype(str).str.zfill(4),
+        "vehicle_id": "V" + pd.Series(vehicle).astype(str).str.zfill(4),
+        "earliest_start": arrival.dt.strftime("%Y-%m-%d %H:%M:%S"),
+        "latest_end": latest_end.dt.strftime("%Y-%m-%d %H:%M:%S"),
+        "energy_kwh": np.round(energy_kwh, 2),
+        "max_kw": np.round(max_kw, 1),
+    }).sort_values("earliest_start").reset_index(drop=True)
 
 if __name__=="__main__":
     start = datetime(2026,2,17,0,0,0)
@@ -1,12 +1,18 @@
+from typing import Dict
+import matplotlib
+matplotlib.use("Agg")
 import matplotlib.pyplot as plt
 import pandas as pd
 
-def plot_load_curve(load: pd.Series, title: str, outpath: str):
-    plt.figure()
-    plt.plot(load.index, load.values)
-    plt.title(title)
-    plt.xlabel("Time")
-    plt.ylabel("kW")
-    plt.tight_layout()
-    plt.savefig(outpath, dpi=200)
-    plt.close()
+def plot_many(curves: Dict[str, pd.Series], title: str, outpath: str):
+    fig, ax = plt.subplots()
+    for name, load in curves.items():
+        ax.plot(load.index, load.values, label=name)
+    ax.set_title(title)
+    ax.set_xlabel("Time")
+    ax.set_ylabel("kW")
+    ax.legend()
+    fig.autofmt_xdate()
+    fig.tight_layout()
+    fig.savefig(outpath, dpi=200)
+    plt.close(fig)
@@ -2,14 +2,20 @@ import json, os
 import pandas as pd
 import yaml
 from datetime import datetime
-from engine import parse_sessions, make_time_index, baseline_load_curve, greedy_optimize_schedule, Tariff, estimate_costs
-from plotting import plot_load_curve
+from engine import parse_sessions, make_time_index, baseline_load_curve, prepare_sessions_for_greedy, greedy_optimize_schedule, Tariff, estimate_costs, build_rate_vector, costs_and_savings, SAVINGS_FIELDS
+from plotting import plot_many
+
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:  # PyYAML built without libyaml
+    from yaml import SafeLoader
 
 def main():
     os.makedirs("data", exist_ok=True)
     os.makedirs("outputs", exist_ok=True)
 
-    cfg = yaml.safe_load(open("config.yaml","r"))
+    with open("config.yaml","r") as f:
+        cfg = yaml.load(f, Loader=SafeLoader)
 
     sessions_path = "data/sessions.csv"
     if not os.path.exists(sessions_path):
@@ -24,29 +30,32 @@ def main():
     idx = make_time_index(t0, t1, cfg["time_bin_minutes"])
 
     baseline = baseline_load_curve(sessions, idx, cfg["time_bin_minutes"])
-    plot_load_curve(baseline, "Baseline load curve (start charging ASAP)", "outputs/baseline_load.png")
+    curves = {"baseline (charge ASAP)": baseline}
 
     tariff = Tariff(**cfg["tariff"])
     summary = {"scenarios": {}}
-    base_costs = estimate_costs(baseline, tariff, cfg["time_bin_minutes"])
+    rates = build_rate_vector(idx, tariff)
+    base_costs = estimate_costs(baseline, tariff, cfg["time_bin_minutes"], rates=rates)
     summary["baseline"] = base_costs
 
+    ss_sorted = prepare_sessions_for_greedy(sessions, cfg["time_bin_minutes"])
     for name, overrides in cfg["savings_scenarios"].items():
         cap = float(overrides.get("depot_power_cap_kw", cfg["depot_power_cap_kw"]))
-        schedule, load = greedy_optimize_schedule(sessions, idx, cfg["time_bin_minutes"], cap, int(cfg["max_concurrent_chargers"]))
-        costs = estimate_costs(load, tariff, cfg["time_bin_minutes"])
+        schedule, load = greedy_optimize_schedule(ss_sorted, idx, cfg["time_bin_minutes"], cap, int(cfg["max_concurrent_chargers"]))
+        costs = costs_and_savings(
+            load.to_numpy(), rates, cfg["time_bin_minutes"]/60.0, tariff.demand_charge_per_kw,
+            base_costs["total_cost"], base_costs["peak_kw"],
+        )
+        savings = {k: costs.pop(k) for k in SAVINGS_FIELDS}
         summary["scenarios"][name] = {
             "depot_power_cap_kw": cap,
             "costs": costs,
-            "savings": {
-                "peak_kw_reduction_pct": (1 - costs["peak_kw"]/base_costs["peak_kw"]) * 100 if base_costs["peak_kw"] else 0,
-                "total_cost_savings": base_costs["total_cost"] - costs["total_cost"],
-                "total_cost_savings_pct": (1 - costs["total_cost"]/base_costs["total_cost"]) * 100 if base_costs["total_cost"] else 0,
-            }
+            "savings": savings,
         }
-        plot_load_curve(load, f"Optimized load curve ({name})", f"outputs/optimized_load_{name}.png")
+        curves[f"optimized ({name})"] = load
         schedule.to_csv(f"outputs/optimized_schedule_{name}.csv", index=False)
 
+    plot_many(curves, "Depot load curves: baseline vs optimized", "outputs/load_curves.png")
     json.dump(summary, open("outputs/summary.json","w"), indent=2)
     print("Done. See outputs/")
 